@@ -1,32 +1,175 @@
-import pytest
-from playwright.sync_api import sync_playwright
+import time
+
+_conftest_started = time.perf_counter()
+
 import os
-from dotenv import load_dotenv
+import pytest
+
+# pytester drives the offline tests of the hooks below
+pytest_plugins = ["pytester"]
+
+# Heavy imports (playwright, urllib for the precheck) are deferred to the
+# fixtures and hooks that need them, so collection and filtered runs on
+# every xdist worker stay cheap.
+
+def _load_env_file():
+    # Same lookup as load_dotenv()'s find_dotenv (this directory, then its
+    # parents), but python-dotenv is only imported when there is a file to load
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        env_file = os.path.join(directory, ".env")
+        if os.path.isfile(env_file):
+            from dotenv import load_dotenv
+            load_dotenv(env_file)
+            return
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return
+        directory = parent
+
+# Load environment variables before utils reads them at import time
+_load_env_file()
+
+from utils.bot_wall import QUARANTINE_PROPERTY, QuarantineReport, check_page, quarantine_record
+from utils.catalog import load_catalog
+from utils.events import log, timeline_html
+from utils.retry import STAGE_ATTEMPTS_PROPERTY, BotWall, RetryPolicy, RetryReport, StageRunner
+from utils.timing import (
+    STEP_TIMINGS_PROPERTY,
+    BrowserSlots,
+    StartupTimes,
+    StepTimer,
+    TimingReport,
+    requested_browsers,
+)
+
+_timing_report = TimingReport()
+_retry_report = RetryReport()
+_quarantine_report = QuarantineReport()
+_startup = StartupTimes()
+# time, os and pytest are already loaded when conftest runs: this is the .env load plus the utils imports
+_startup.record_phase("conftest_env_and_utils", time.perf_counter() - _conftest_started)
+
+def pytest_configure(config):
+    try:
+        config.requested_browsers = requested_browsers(os.getenv("BROWSER", "chromium"))
+    except ValueError as e:
+        raise pytest.UsageError(str(e))
+    config.product_catalog = load_catalog(os.getenv("PRODUCT_CATALOG"))
+
+    # Each xdist worker keeps one browser open for its whole session, so the
+    # browser limit is really a cap on workers: more workers would only wait
+    try:
+        config.max_concurrent_browsers = int(os.getenv("MAX_CONCURRENT_BROWSERS", "0"))
+    except ValueError:
+        raise pytest.UsageError("MAX_CONCURRENT_BROWSERS must be an integer")
+    workers = config.getoption("numprocesses", None) or 0
+    if 0 < config.max_concurrent_browsers < workers:
+        raise pytest.UsageError(
+            f"MAX_CONCURRENT_BROWSERS={config.max_concurrent_browsers} is lower than -n {workers}: "
+            f"each worker holds a browser for its whole session, so run with "
+            f"-n {config.max_concurrent_browsers} or raise the limit"
+        )
+    # One browser slot directory per run: made by the controller, shared with xdist workers
+    if hasattr(config, "workerinput"):
+        config.browser_slots_dir = config.workerinput.get("browser_slots_dir")
+    elif config.max_concurrent_browsers > 0:
+        config.browser_slots_dir = BrowserSlots.make_directory()
+    else:
+        config.browser_slots_dir = None
+
+    # One JSON lines file per xdist worker so parallel output never interleaves
+    worker = os.getenv("PYTEST_XDIST_WORKER", "master")
+    event_log_dir = os.getenv("EVENT_LOG_DIR")
+    try:
+        log.configure(
+            path=os.path.join(event_log_dir, f"events-{worker}.jsonl") if event_log_dir else None,
+            level=os.getenv("EVENT_LOG_LEVEL", "info").lower(),
+            echo=os.getenv("EVENT_LOG_ECHO", "true").lower() == "true",
+        )
+    except ValueError as e:
+        raise pytest.UsageError(str(e))
+    log.context["worker"] = worker
+
+def pytest_unconfigure(config):
+    log.close()
+    # Not set when pytest_configure stopped early with a usage error
+    slots_dir = getattr(config, "browser_slots_dir", None)
+    if slots_dir and not hasattr(config, "workerinput"):
+        BrowserSlots.remove_directory(slots_dir)
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    node.workerinput["browser_slots_dir"] = node.config.browser_slots_dir
+
+def pytest_collection(session):
+    session.collection_started = time.perf_counter()
+
+def pytest_collection_finish(session):
+    _startup.record_phase("collection", time.perf_counter() - session.collection_started)
 
-# Load environment variables
-load_dotenv()
+def pytest_sessionfinish(session):
+    # xdist ships workeroutput back to the controller (pytest_testnodedown)
+    if hasattr(session.config, "workeroutput"):
+        session.config.workeroutput["startup"] = _startup.as_dict()
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    startup = getattr(node, "workeroutput", {}).get("startup")
+    if startup:
+        _timing_report.add_startup(node.gateway.id, startup)
+
+def pytest_generate_tests(metafunc):
+    # BROWSER=all (or a comma separated list) runs every test once per engine
+    browsers = metafunc.config.requested_browsers
+    if "browser_name" in metafunc.fixturenames and len(browsers) > 1:
+        metafunc.parametrize("browser_name", browsers, scope="session")
+    # PRODUCT_CATALOG with several products runs every product test once per product
+    catalog = metafunc.config.product_catalog
+    if "product" in metafunc.fixturenames and len(catalog) > 1:
+        metafunc.parametrize("product", catalog, ids=[p.term for p in catalog])
+
+@pytest.fixture
+def product(pytestconfig):
+    return pytestconfig.product_catalog[0]
+
+@pytest.fixture(scope="session")
+def browser_name(pytestconfig):
+    return pytestconfig.requested_browsers[0]
+
+@pytest.fixture(scope="session")
+def browser_slots(pytestconfig):
+    # Upper bound on browsers launched at once across all xdist workers (0 = unlimited)
+    return BrowserSlots(
+        pytestconfig.max_concurrent_browsers,
+        pytestconfig.browser_slots_dir,
+        timeout=float(os.getenv("BROWSER_SLOT_TIMEOUT", "600")),
+    )
 
 @pytest.fixture(scope="session")
 def playwright():
-    with sync_playwright() as p:
+    sync_api = _startup.timed_import("playwright.sync_api")
+    with sync_api.sync_playwright() as p:
         yield p
 
 @pytest.fixture(scope="session")
-def browser(playwright):
-    browser_name = os.getenv("BROWSER", "chromium")
+def browser(playwright, browser_name, browser_slots):
     headless = os.getenv("HEADLESS", "true").lower() == "true"
-    
-    if browser_name == "chromium":
-        browser = playwright.chromium.launch(headless=headless)
-    elif browser_name == "firefox":
-        browser = playwright.firefox.launch(headless=headless)
-    elif browser_name == "webkit":
-        browser = playwright.webkit.launch(headless=headless)
-    else:
-        browser = playwright.chromium.launch(headless=headless)
-    
-    yield browser
-    browser.close()
+
+    slot = browser_slots.acquire()
+    try:
+        launch_started = time.perf_counter()
+        browser = getattr(playwright, browser_name).launch(headless=headless)
+        _startup.record_phase(f"launch_{browser_name}", time.perf_counter() - launch_started)
+    except Exception:
+        browser_slots.release(slot)
+        raise
+
+    try:
+        yield browser
+        browser.close()
+    finally:
+        browser_slots.release(slot)
 
 @pytest.fixture(scope="function")
 def page(browser):
@@ -38,4 +181,119 @@ def page(browser):
     )
     page = context.new_page()
     yield page
-    context.close()
\ No newline at end of file
+    context.close()
+
+@pytest.fixture(scope="function")
+def cart_with(page):
+    # Factory: cart_with(items=[(asin, qty)]) seeds the cart and lands on the cart page
+    from utils.cart import seed_cart
+
+    def seed(items):
+        return seed_cart(page, items)
+    return seed
+
+@pytest.fixture(scope="function")
+def step_timer(request, browser_name):
+    timer = StepTimer()
+    yield timer
+    timer.end()
+    # user_properties travel with the report, so this also works under xdist
+    request.node.user_properties.append(
+        (STEP_TIMINGS_PROPERTY, {"browser": browser_name, "steps": timer.records})
+    )
+
+@pytest.fixture(scope="function")
+def stages(request, page, step_timer):
+    runner = StageRunner(
+        page, RetryPolicy.from_env(), step_timer=step_timer, wall_check=lambda response=None: check_page(page, response)
+    )
+    yield runner
+    request.node.user_properties.append((STAGE_ATTEMPTS_PROPERTY, runner.attempts))
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    log.begin_test(item.nodeid)
+
+    # With PRECHECK=true browser tests only run for products whose search
+    # results pass the DOM-only checks, before any browser is launched.
+    # Seeded-cart tests never search, so the search precheck does not apply.
+    if (os.getenv("PRECHECK", "false").lower() == "true" and "page" in item.fixturenames
+            and "product" in item.fixturenames and "cart_with" not in item.fixturenames):
+        from utils.precheck import run_precheck
+
+        callspec = getattr(item, "callspec", None)
+        product = callspec.params["product"] if callspec and "product" in callspec.params else item.config.product_catalog[0]
+        try:
+            result = run_precheck(product)
+        except BotWall:
+            # Plain HTTP got walled; that says nothing about the browser run
+            return
+        # An unreachable search page says nothing about the product either
+        if result.error is None and not result.passed:
+            pytest.skip(f"DOM precheck failed: {result.failure}")
+
+def pytest_runtest_logfinish(nodeid, location):
+    log.end_test()
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    # Replay the events of the test as a timeline in the HTML report
+    # (the html plugin is registered whenever pytest-html is installed; only --html writes a report)
+    if call.when == "call" and item.config.getoption("htmlpath", None):
+        events = log.test_events()
+        if events:
+            from pytest_html import extras as html_extras
+
+            extras = getattr(report, "extras", [])
+            extras.append(html_extras.html(timeline_html(events)))
+            report.extras = extras
+    # A bot wall means the flow was never exercised: quarantine instead of failing
+    if call.when == "call" and call.excinfo is not None and call.excinfo.errisinstance(BotWall):
+        wall = call.excinfo.value
+        record = quarantine_record(wall, wall.stage)
+        report.outcome = "skipped"
+        report.longrepr = (str(item.path), item.location[1], f"Quarantined: {wall}")
+        report.user_properties.append((QUARANTINE_PROPERTY, record))
+        item.user_properties.append((QUARANTINE_PROPERTY, record))
+
+def pytest_report_teststatus(report, config):
+    if report.skipped and any(name == QUARANTINE_PROPERTY for name, _ in report.user_properties):
+        return "quarantined", "Q", "QUARANTINED"
+
+def pytest_runtest_logreport(report):
+    if report.when != "teardown":
+        return
+    for name, value in report.user_properties:
+        if name == STEP_TIMINGS_PROPERTY:
+            _timing_report.add(value["browser"], value["steps"])
+        elif name == STAGE_ATTEMPTS_PROPERTY:
+            _retry_report.add(report.nodeid, value)
+        elif name == QUARANTINE_PROPERTY:
+            _quarantine_report.add(report.nodeid, value)
+
+def pytest_terminal_summary(terminalreporter, config):
+    if hasattr(config, "workerinput"):
+        return
+    if _quarantine_report:
+        terminalreporter.write_sep("=", "quarantined (bot wall)")
+        for line in _quarantine_report.format_lines():
+            terminalreporter.write_line(line)
+        quarantine_path = os.getenv("QUARANTINE_REPORT")
+        if quarantine_path:
+            _quarantine_report.write_json(quarantine_path)
+    if _retry_report:
+        terminalreporter.write_sep("=", "stage retries")
+        for line in _retry_report.format_lines():
+            terminalreporter.write_line(line)
+    _timing_report.add_startup(os.getenv("PYTEST_XDIST_WORKER", "master"), _startup.as_dict())
+    report_path = os.getenv("TIMING_REPORT")
+    if not _timing_report and not report_path:
+        return
+    terminalreporter.write_sep("=", "step timings per browser")
+    for line in _timing_report.format_table() + _timing_report.format_startup():
+        terminalreporter.write_line(line)
+    if report_path:
+        _timing_report.write_json(report_path)
+        terminalreporter.write_line(f"Step timing report written to {report_path}")
@@ -0,0 +1,25 @@
+import pytest
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from playwright.sync_api import Page
+
+from utils import amazon_flow as flow
+from utils.events import log
+
+class TestSeededCart:
+    def test_update_quantity_and_checkout(self, product, page: "Page", stages, cart_with):
+        """Cart and checkout checks starting from a seeded cart instead of the search flow"""
+
+        if product.asin is None:
+            pytest.skip(f"No ASIN in the catalog for {product.term!r} to seed the cart with")
+
+        # Seeding adds to the cart; a retry would double the quantity
+        stages.run("seed_cart", cart_with, [(product.asin, 1)], retry=False)
+        stages.run("update_quantity", flow.update_quantity, page, 2)
+        item_price = flow.read_cart_item_price(page)
+        stages.run("checkout", flow.proceed_to_checkout, page)
+        stages.run("grand_total", flow.validate_grand_total, page, item_price, 2)
+
+        stages.step_timer.end()
+        log.info("Seeded cart test completed successfully")
@@ -0,0 +1,106 @@
+import pytest
+
+from utils.fingerprint import UNKNOWN, PageFingerprint, classify, detect_variant, fingerprint_page
+from utils.retry import BotWall
+
+def fingerprint(path="/", title="Amazon.com", present=(), visible=None, status=None):
+    return PageFingerprint(path, title, present, present if visible is None else visible, status)
+
+class NavigatingPage:
+    """A page whose execution context goes away mid-navigation"""
+
+    url = "https://example.test/cart/smart-wagon?newItems=1"
+
+    def wait_for_load_state(self, state, timeout=None):
+        pass
+
+    def evaluate(self, script, arg=None):
+        # Imported here so collection never loads playwright
+        from playwright.sync_api import Error as PlaywrightError
+        raise PlaywrightError("Execution context was destroyed, most likely because of a navigation")
+
+class LoadedPage:
+    """A loaded page whose fingerprint script returns ``data``"""
+
+    url = "https://example.test/s?k=airpods"
+
+    def __init__(self, **data):
+        self.data = dict({"path": "/s", "title": "Amazon.com", "status": None, "present": [], "visible": []}, **data)
+
+    def wait_for_load_state(self, state, timeout=None):
+        pass
+
+    def evaluate(self, script, arg=None):
+        return self.data
+
+class Response:
+    def __init__(self, status):
+        self.status = status
+
+class TestBotWallVariants:
+    """Bot walls are recognised from the fingerprint alone"""
+
+    @pytest.mark.parametrize("page_fingerprint, reason", [
+        (fingerprint("/errors/validateCaptcha", present=("captcha_form",)), "captcha"),
+        (fingerprint("/", title="Robot Check"), "robot_check"),
+        (fingerprint("/s", title="Sorry! Something went wrong!"), "sorry_page"),
+        (fingerprint("/s", title="", status=503), "service_unavailable"),
+        (fingerprint("/s", title="503 - Service Unavailable Error"), "service_unavailable"),
+    ], ids=["captcha", "robot_check", "sorry", "503_status", "503_title"])
+    def test_wall_variants(self, page_fingerprint, reason):
+        variant = classify(page_fingerprint)
+
+        assert variant.name == reason
+        assert variant.bot_wall
+
+    def test_search_page_is_not_a_wall(self):
+        assert not classify(fingerprint("/s", present=("search_result",))).bot_wall
+
+    def test_response_status_catches_a_503_without_navigation_timing(self):
+        """WebKit has no responseStatus in navigation timing; the goto Response still has it"""
+
+        page = LoadedPage(title="")
+
+        with pytest.raises(BotWall) as excinfo:
+            detect_variant(page, Response(503))
+        assert excinfo.value.reason == "service_unavailable"
+        assert detect_variant(page, Response(200))[1] is UNKNOWN
+
+class TestVariantSelectors:
+    """Variant selector sets skip the probes that cannot match on the layout"""
+
+    def test_stepper_cart_goes_straight_to_the_plus_button(self):
+        variant = classify(fingerprint("/gp/cart/view.html", present=("active_cart", "quantity_plus")))
+
+        assert variant.name == "cart_stepper"
+        assert variant.selectors_for("quantity", ["select[name*='quantity']"]) == []
+        assert variant.selectors_for("quantity_plus", ["button[aria-label*='Increase']"]) == ["button[aria-label*='Increase']"]
+
+    def test_dropdown_cart_never_probes_plus_buttons(self):
+        variant = classify(fingerprint("/gp/cart/view.html", present=("active_cart", "quantity_select")))
+
+        assert variant.name == "cart_dropdown"
+        assert variant.selectors_for("quantity_plus", ["button[aria-label*='Increase']"]) == []
+
+    def test_input_only_product_page_tries_the_input_first(self):
+        variant = classify(fingerprint("/gp/product/B0", present=("product_title", "add_to_cart_input")))
+
+        assert variant.name == "product_atc_input"
+        assert variant.selectors_for("add_to_cart", ["#add-to-cart-button", "input[name='submit.add-to-cart']"]) == [
+            "input[name='submit.add-to-cart']", "#add-to-cart-button",
+        ]
+
+    def test_buy_now_stays_behind_the_generic_add_to_cart_selectors(self):
+        variant = classify(fingerprint("/dp/B0", present=("product_title", "buy_now_button")))
+
+        assert variant.name == "product_no_cart_button"
+        assert variant.selectors_for("add_to_cart", ["#add-to-cart-button", "#buy-now-button"]) == [
+            "#add-to-cart-button", "#buy-now-button",
+        ]
+
+class TestFingerprintPage:
+    def test_destroyed_execution_context_classifies_as_unknown(self):
+        result = fingerprint_page(NavigatingPage())
+
+        assert result.path == "/cart/smart-wagon"
+        assert classify(result) is UNKNOWN
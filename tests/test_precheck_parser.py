@@ -0,0 +1,95 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from utils import amazon_flow
+from utils.catalog import Product
+from utils.precheck import fetch_search_html, parse_search_html, run_precheck
+from utils.retry import BotWall
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+AIRPODS = Product("Apple AirPods Max", keywords=("apple", "airpods"))
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as fh:
+        return fh.read()
+
+class BogusCharsetHandler(BaseHTTPRequestHandler):
+    """Serves the recorded search page with a charset Python does not know"""
+
+    def do_GET(self):
+        body = read_fixture("search_results.html").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=x-no-such-charset")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    server = HTTPServer(("127.0.0.1", 0), BogusCharsetHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.delenv("PRECHECK_REPLAY_DIR", raising=False)
+    monkeypatch.setattr(amazon_flow, "BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+class TestSearchResultParser:
+    """DOM-only precheck parsing, run offline on recorded HTML"""
+
+    def test_counts_results_with_implicitly_closed_elements(self):
+        """Unclosed <p>, <li>, <td> and <option> inside a result do not swallow the next one"""
+
+        result = parse_search_html(AIRPODS, "fixture", read_fixture("search_results.html"))
+
+        assert result.count == 3
+        assert result.texts[0] == "Sponsored Wireless Over-Ear Headphones, Noise Cancelling Black White"
+        assert result.match_index == 1
+        assert result.passed
+
+    def test_result_closed_by_the_next_result(self):
+        html = (
+            '<div data-component-type="s-search-result"><p>x</div>'
+            '<div data-component-type="s-search-result">Apple AirPods Max</div>'
+        )
+
+        result = parse_search_html(AIRPODS, "inline", html)
+
+        assert result.count == 2
+        assert result.texts == ["x", "Apple AirPods Max"]
+
+    def test_text_after_the_last_result_is_not_captured(self):
+        html = '<div data-component-type="s-search-result"><p>Case</div><footer>Apple AirPods</footer>'
+
+        result = parse_search_html(AIRPODS, "inline", html)
+
+        assert result.texts == ["Case"]
+        assert result.match_index is None
+
+    def test_captcha_page_is_a_bot_wall(self):
+        html = '<title>Amazon.com</title><form action="/errors/validateCaptcha"></form>'
+
+        with pytest.raises(BotWall):
+            parse_search_html(AIRPODS, "inline", html)
+
+    def test_missing_replay_file_is_recorded_once(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("PRECHECK_REPLAY_DIR", str(tmp_path))
+        product = Product("Not Recorded")
+
+        result = run_precheck(product)
+
+        assert result.error is not None and "FileNotFoundError" in result.error
+        assert not result.passed
+        assert run_precheck(product) is result
+
+    def test_unknown_charset_falls_back_to_utf8(self, stand_in):
+        source, html = fetch_search_html("Apple AirPods Max")
+
+        assert source.endswith("/s?k=Apple+AirPods+Max")
+        assert parse_search_html(AIRPODS, source, html).count == 3
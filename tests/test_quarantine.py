@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WALLED_TEST = """
+from utils.retry import BotWall
+
+def test_walled():
+    raise BotWall("captcha", "https://example.test/errors/validateCaptcha")
+
+def test_passes():
+    pass
+"""
+
+@pytest.fixture
+def suite(pytester, monkeypatch):
+    """A throwaway suite using this repo's conftest and utils"""
+    monkeypatch.setenv("PYTHONPATH", REPO_ROOT)
+    monkeypatch.delenv("EVENT_LOG_DIR", raising=False)
+    monkeypatch.delenv("QUARANTINE_REPORT", raising=False)
+    with open(os.path.join(REPO_ROOT, "conftest.py"), encoding="utf-8") as fh:
+        pytester.makeconftest(fh.read())
+    return pytester
+
+class TestQuarantineHook:
+    """A BotWall is reported as QUARANTINED (a skip), not as a failure"""
+
+    def test_bot_wall_is_quarantined(self, suite):
+        suite.makepyfile(test_walled=WALLED_TEST)
+
+        result = suite.runpytest_subprocess("-v", "-p", "no:cacheprovider")
+
+        assert result.ret == 0
+        assert result.parseoutcomes() == {"passed": 1, "quarantined": 1}
+        result.stdout.fnmatch_lines([
+            "*test_walled QUARANTINED*",
+            "*quarantined (bot wall)*",
+            "*test_walled.py::test_walled at *: captcha (https://example.test/errors/validateCaptcha)",
+        ])
+
+    def test_short_status_letter(self, suite):
+        suite.makepyfile(test_walled=WALLED_TEST)
+
+        result = suite.runpytest_subprocess("-p", "no:cacheprovider")
+
+        assert result.ret == 0
+        result.stdout.fnmatch_lines(["test_walled.py Q.*"])
@@ -0,0 +1,18 @@
+import pytest
+
+from utils.amazon_flow import MATCH_WINDOW, MIN_RESULTS
+from utils.precheck import precheck_enabled, run_precheck
+
+pytestmark = pytest.mark.skipif(not precheck_enabled(), reason="DOM-only precheck runs with PRECHECK=true")
+
+class TestSearchPrecheck:
+    def test_search_results_without_browser(self, product):
+        """Search assertions of the browser flow, run on the fetched HTML only"""
+
+        result = run_precheck(product)
+
+        assert result.error is None, result.failure
+        assert result.count >= MIN_RESULTS, f"Expected at least {MIN_RESULTS} search results but found {result.count}"
+        assert result.match_index is not None, (
+            f"None of the first {MATCH_WINDOW} results contains {', '.join(product.keywords)}"
+        )
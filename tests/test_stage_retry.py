@@ -0,0 +1,127 @@
+import pytest
+
+from utils.retry import BotWall, FailureKind, RetryPolicy, RetryReport, StageFailure, StageRunner
+
+class StubPage:
+    """Just enough of a Playwright page for StageRunner"""
+
+    def __init__(self, url="https://example.test/"):
+        self.url = url
+        self.visited = []
+
+    def goto(self, url):
+        self.visited.append(url)
+        self.url = url
+
+    def wait_for_load_state(self, state, timeout=None):
+        pass
+
+def flaky(failures, kind=FailureKind.TIMEOUT):
+    """A stage function failing ``failures`` times before it passes"""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise StageFailure(kind, f"attempt {len(calls)} failed")
+        return "done"
+    fn.calls = calls
+    return fn
+
+def make_runner(page=None, wall_check=None, **policy):
+    return StageRunner(page or StubPage(), RetryPolicy(**policy), wall_check=wall_check, sleep=lambda seconds: None)
+
+class TestRetryPolicy:
+    def test_delay_backs_off_exponentially_up_to_the_cap(self):
+        policy = RetryPolicy(backoff=1.0, backoff_factor=2.0, max_backoff=5.0)
+
+        assert [policy.delay(n) for n in (1, 2, 3, 4)] == [1.0, 2.0, 4.0, 5.0]
+
+class TestStageRunner:
+    def test_retries_a_timeout_until_it_passes(self):
+        runner = make_runner()
+        fn = flaky(2)
+
+        assert runner.run("search", fn) == "done"
+        assert [a["outcome"] for a in runner.attempts] == ["timeout", "timeout", "passed"]
+        assert runner.retries_left == 1
+
+    def test_budget_is_shared_by_all_stages(self):
+        runner = make_runner(max_attempts=5, budget=1)
+
+        assert runner.run("homepage", flaky(1)) == "done"
+        with pytest.raises(StageFailure):
+            runner.run("search", flaky(1))
+        assert [(a["stage"], a["outcome"]) for a in runner.attempts] == [
+            ("homepage", "timeout"), ("homepage", "passed"), ("search", "timeout"),
+        ]
+
+    def test_assertions_are_not_retried(self):
+        runner = make_runner()
+
+        def fn():
+            assert False, "wrong total"
+
+        with pytest.raises(AssertionError):
+            runner.run("grand_total", fn)
+        assert len(runner.attempts) == 1
+
+    def test_retry_false_raises_on_the_first_failure(self):
+        runner = make_runner()
+        fn = flaky(1)
+
+        with pytest.raises(StageFailure):
+            runner.run("seed_cart", fn, retry=False)
+        assert len(fn.calls) == 1
+        assert runner.attempts[0]["outcome"] == FailureKind.TIMEOUT
+        assert runner.retries_left == 3
+
+    def test_retry_restores_the_last_passed_checkpoint(self):
+        page = StubPage()
+        runner = make_runner(page)
+        runner.run("search", lambda: page.goto("https://example.test/s?k=airpods"))
+
+        def open_result():
+            page.url = "https://example.test/dp/B0"
+            if len(page.visited) < 2:
+                raise StageFailure(FailureKind.SELECTOR_MISS, "no title")
+
+        runner.run("product_page", open_result)
+        assert page.visited == ["https://example.test/s?k=airpods", "https://example.test/s?k=airpods"]
+        assert runner.checkpoint_url == "https://example.test/dp/B0"
+
+    def test_timeout_in_front_of_a_bot_wall_is_quarantined(self):
+        def wall_check():
+            raise BotWall("captcha", "https://example.test/errors/validateCaptcha")
+
+        runner = make_runner(wall_check=wall_check)
+        fn = flaky(5)
+
+        with pytest.raises(BotWall) as excinfo:
+            runner.run("search", fn)
+        assert excinfo.value.stage == "search"
+        assert len(fn.calls) == 1
+        assert runner.attempts[0]["outcome"] == "quarantined"
+
+class TestRetryReport:
+    def test_counts_failures_recoveries_and_give_ups(self):
+        report = RetryReport()
+        report.add("test_a", [
+            {"stage": "search", "attempt": 1, "outcome": "timeout", "error": "slow"},
+            {"stage": "search", "attempt": 2, "outcome": "passed", "error": None},
+            {"stage": "checkout", "attempt": 1, "outcome": "selector_miss", "error": "no button"},
+        ])
+
+        assert report.failures == {"timeout": 1, "selector_miss": 1}
+        assert report.recovered == {"search": 1}
+        assert [(nodeid, record["stage"]) for nodeid, record in report.failed_tests] == [("test_a", "checkout")]
+
+    def test_quarantined_attempts_are_left_out(self):
+        report = RetryReport()
+        report.add("test_b", [
+            {"stage": "search", "attempt": 1, "outcome": "timeout", "error": "slow"},
+            {"stage": "search", "attempt": 2, "outcome": "quarantined", "error": "captcha"},
+        ])
+
+        assert report.failures == {"timeout": 1}
+        assert report.failed_tests == []
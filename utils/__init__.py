@@ -0,0 +1 @@
+"""Shared helpers for the Amazon UX test suite."""
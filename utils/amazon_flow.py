@@ -0,0 +1,881 @@
+"""Stages of the Amazon search -> cart -> checkout flow.
+
+Each stage works on the page it is given and raises ``StageFailure`` at
+the known flaky points so ``StageRunner`` can retry just that stage.
+Every stage fingerprints the page after navigating, which raises
+``BotWall`` as soon as a CAPTCHA or robot check is served.
+"""
+import os
+import re
+import time
+from urllib.parse import quote_plus
+
+from utils.events import log
+from utils.fingerprint import detect_variant, is_product_page
+from utils.retry import FailureKind, StageFailure
+
+# Point at a local stand-in of the storefront with AMAZON_BASE_URL
+BASE_URL = os.getenv("AMAZON_BASE_URL", "https://www.amazon.com").rstrip("/")
+CART_URL = f"{BASE_URL}/gp/cart/view.html"
+
+# Search assertions shared with the DOM-only precheck
+MIN_RESULTS = 2
+MATCH_WINDOW = 5  # how many leading results may hold the wanted product
+
+SEARCH_RESULT_SELECTORS = [
+    "[data-component-type='s-search-result']",
+    "[data-testid='s-search-result']",
+    ".s-search-result",
+    ".sg-col-inner .s-widget-container"
+]
+
+
+def open_homepage(page):
+    # First navigate to Amazon homepage to avoid bot detection
+    log.info("Navigating to Amazon homepage...")
+    response = page.goto(BASE_URL)
+
+    # Wait for page to load
+    page.wait_for_load_state("load", timeout=10000)
+    time.sleep(2)
+
+    # Check for CAPTCHA or bot detection (raises BotWall)
+    detect_variant(page, response)
+
+
+def search_url(search_term):
+    return f"{BASE_URL}/s?k={quote_plus(search_term)}"
+
+
+def matches_product(text, keywords):
+    text = text.lower()
+    return all(keyword in text for keyword in keywords)
+
+
+def search_products(page, search_term):
+    url = search_url(search_term)
+    log.info(f"Navigating to: {url}")
+    response = page.goto(url)
+
+    # Wait for page to load
+    page.wait_for_load_state("load", timeout=15000)
+    time.sleep(3)
+
+    # Check for search results, starting with the selectors of the served layout
+    fingerprint, variant = detect_variant(page, response)
+    search_result_selectors = variant.selectors_for("search_results", SEARCH_RESULT_SELECTORS)
+    search_results = None
+    for selector in search_result_selectors:
+        try:
+            page.wait_for_selector(selector, timeout=5000)
+            search_results = page.locator(selector)
+            if search_results.count() > 0:
+                log.info(f"Found search results with selector: {selector}")
+                break
+        except:
+            continue
+
+    if search_results is None:
+        log.warning("Could not find search results with standard selectors")
+        # Take screenshot for debugging
+        page.screenshot(path="search_results_debug.png")
+        # Try alternative approach
+        log.info("Attempting alternative search...")
+        response = page.goto(BASE_URL)
+        time.sleep(2)
+        detect_variant(page, response)
+        # Use search box instead
+        try:
+            search_box = page.locator("#twotabsearchtextbox")
+            if search_box.is_visible():
+                search_box.fill(search_term)
+                search_box.press("Enter")
+                page.wait_for_load_state("load", timeout=10000)
+                time.sleep(3)
+                # Try again with search results
+                for selector in SEARCH_RESULT_SELECTORS:
+                    try:
+                        search_results = page.locator(selector)
+                        if search_results.count() > 0:
+                            log.info(f"Found search results after search box with selector: {selector}")
+                            break
+                    except:
+                        continue
+        except Exception as e:
+            log.warning(f"Search box approach failed: {e}")
+
+    if search_results is None:
+        raise StageFailure(FailureKind.TIMEOUT, "Could not find search results with any method")
+
+    results_count = search_results.count()
+    log.info(f"Found {results_count} search results")
+
+    # Verify we have at least 2 results
+    assert results_count >= MIN_RESULTS, f"Expected at least {MIN_RESULTS} search results but found {results_count}"
+    return search_results
+
+
+def open_best_result(page, search_results, keywords):
+    # Look for results that contain all product keywords for better match
+    log.info(f"Looking for results matching {', '.join(keywords)}...")
+    best_result = None
+    best_result_index = -1
+
+    for i in range(min(search_results.count(), MATCH_WINDOW)):  # Check first 5 results
+        result = search_results.nth(i)
+        try:
+            # Get the text content of the result
+            if matches_product(result.inner_text(), keywords):
+                log.info(f"Found matching result at index {i}")
+                best_result = result
+                best_result_index = i
+                break
+        except:
+            continue
+
+    # If no matching product found, use second result as fallback
+    if best_result is None:
+        log.info("No matching product found, using second result as fallback")
+        best_result = search_results.nth(1)
+        best_result_index = 1
+
+    log.info(f"Selecting result at index {best_result_index}")
+    log.debug(f"Selected result is visible: {best_result.is_visible()}")
+
+    # Click on the selected result
+    log.info("Clicking on selected search result...")
+
+    # Look for clickable links in the selected result
+    all_links = best_result.locator("a")
+    if all_links.count() > 0:
+        # Click the first available link (usually the product link)
+        all_links.first.click()
+    else:
+        # Fallback: click on the result container itself
+        best_result.click()
+
+    # Wait for page to load (use a simpler load state)
+    page.wait_for_load_state("load", timeout=10000)
+
+    # Print current URL to verify navigation
+    log.info(f"Current URL after click: {page.url}")
+
+    # Simple verification - check if we're on a product page
+    current_url = page.url
+    if "/dp/" in current_url:
+        log.info("Successfully navigated to product page")
+    elif "/gp/" in current_url:
+        log.info("Successfully navigated to product page (gp format)")
+    else:
+        log.info(f"Successfully clicked and navigated to: {current_url}")
+
+    # Try to get product title if available
+    product_title = None
+    try:
+        product_title_element = page.locator("#productTitle, h1").first
+        if product_title_element.is_visible():
+            product_title = product_title_element.inner_text()
+            log.info(f"Product title: {product_title}")
+    except:
+        log.info("Could not extract product title")
+    return product_title
+
+
+def add_to_cart(page):
+    """Click 'Add to Cart' and return whether the addition was confirmed."""
+    log.debug("Adding item to cart")
+
+    # Wait a moment for page to fully load
+    time.sleep(2)
+
+    # Check if this is a standard Amazon product page (/dp/ or /gp/ layout)
+    fingerprint, variant = detect_variant(page)
+    if not is_product_page(fingerprint):
+        log.info("Non-standard Amazon page detected - skipping cart functionality")
+        log.info("This might be a sponsored product or external seller page")
+        return False
+
+    log.info("Standard Amazon product page detected")
+
+    # Look for "Add to Cart" button with multiple approaches
+    add_to_cart_selectors = [
+        "#add-to-cart-button",
+        "input[name='submit.add-to-cart']",
+        "[data-action='add-to-cart']",
+        "button:has-text('Add to Cart')",
+        "input[value*='Add to Cart']",
+        "button:has-text('Add to cart')",  # lowercase version
+        "[title*='Add to Cart']",
+        "[aria-label*='Add to Cart']",
+        "#buy-now-button",  # Alternative buy button
+        ".a-button-input[aria-labelledby*='cart']"
+    ]
+
+    cart_button_found = False
+    for selector in variant.selectors_for("add_to_cart", add_to_cart_selectors):
+        try:
+            cart_button = page.locator(selector).first
+            if cart_button.is_visible():
+                log.info(f"Found 'Add to Cart' button with selector: {selector}")
+                cart_button.click()
+                cart_button_found = True
+                break
+        except:
+            continue
+
+    # If specific selectors don't work, try finding by text in spans and other elements
+    if not cart_button_found:
+        log.debug("Searching for cart elements by text content...")
+        # Look for clickable elements with cart-related text
+        cart_elements = page.locator("span, button, input, a").filter(has_text="Add to Cart")
+        if cart_elements.count() > 0:
+            log.debug(f"Found {cart_elements.count()} elements with 'Add to Cart' text")
+            for i in range(cart_elements.count()):
+                try:
+                    element = cart_elements.nth(i)
+                    if element.is_visible():
+                        # First try clicking the element directly if it's a button or input
+                        tag_name = element.get_attribute("tagName").lower()
+                        if tag_name in ["button", "input"]:
+                            log.debug(f"Clicking cart {tag_name} element {i+1}")
+                            element.click()
+                            cart_button_found = True
+                            break
+                        else:
+                            # Try to find the clickable parent
+                            try:
+                                parent_button = element.locator("xpath=ancestor::button | xpath=ancestor::input | xpath=ancestor::a").first
+                                if parent_button.is_visible():
+                                    log.debug(f"Clicking parent button of cart element {i+1}")
+                                    parent_button.click()
+                                    cart_button_found = True
+                                    break
+                            except:
+                                # Try clicking the element itself as fallback
+                                try:
+                                    log.debug(f"Trying to click cart element {i+1} directly")
+                                    element.click()
+                                    cart_button_found = True
+                                    break
+                                except:
+                                    continue
+                except:
+                    continue
+
+    if not cart_button_found:
+        log.error("Could not find 'Add to Cart' button on Amazon product page")
+        # Show some page structure for debugging
+        log.debug("Page structure analysis:")
+        main_content = page.locator("#centerCol, #rightCol, .s-main-slot").first
+        if main_content.is_visible():
+            buttons_in_main = main_content.locator("button, input[type='submit'], input[type='button']")
+            log.debug(f"Found {buttons_in_main.count()} buttons in main content area")
+            for i in range(min(buttons_in_main.count(), 5)):
+                try:
+                    button = buttons_in_main.nth(i)
+                    if button.is_visible():
+                        button_text = button.inner_text().strip()
+                        log.debug(f"Main button {i+1}: '{button_text[:50]}'")
+                except:
+                    pass
+        raise StageFailure(FailureKind.SELECTOR_MISS, "Could not find 'Add to Cart' button on product page")
+
+    log.info("Clicked 'Add to Cart' button")
+
+    # Wait for cart confirmation or page update
+    time.sleep(3)
+
+    # Check for cart confirmation messages
+    cart_confirmations = [
+        "[data-feature-name='addToCart']",
+        "#attachDisplayAddBaseAlert",
+        "#sw-atc-details-single-container",
+        ".a-alert-success",
+        "#huc-v2-order-row-confirm-text",
+        ".a-size-medium-plus:has-text('Added to Cart')"
+    ]
+
+    fingerprint, variant = detect_variant(page)
+    cart_confirmed = False
+    for selector in variant.selectors_for("cart_confirmation", cart_confirmations):
+        try:
+            if page.locator(selector).count() > 0:
+                log.info(f"Cart confirmation found: {selector}")
+                cart_confirmed = True
+                break
+        except:
+            continue
+
+    if not cart_confirmed:
+        # Alternative: Check if cart icon has updated
+        try:
+            cart_count = page.locator("#nav-cart-count, .nav-cart-count").first
+            if cart_count.is_visible():
+                count_text = cart_count.inner_text()
+                log.info(f"Cart count: {count_text}")
+                cart_confirmed = True
+        except:
+            pass
+
+    if cart_confirmed:
+        log.info("Item successfully added to cart")
+    else:
+        log.warning("Could not confirm item was added to cart")
+    return cart_confirmed
+
+
+def dismiss_protection_popup(page):
+    """Decline the protection plan offer; returns whether a popup was handled."""
+    # Handle protection plan popup if it appears
+    log.debug("Handling protection plan popup")
+    time.sleep(3)  # Wait longer for popup to appear
+
+    fingerprint, variant = detect_variant(page)
+    if variant.expects_popup is False:
+        log.info("No protection plan popup on this layout")
+        return False
+
+    protection_handled = False
+
+    # 0. Go straight to the buttons of a known popup layout
+    for selector in variant.selectors.get("protection_popup", []):
+        try:
+            popup_button = page.locator(selector).first
+            if popup_button.is_visible():
+                log.info(f"Found protection plan button for {variant.name}: {selector}")
+                popup_button.click()
+                protection_handled = True
+                time.sleep(2)
+                break
+        except:
+            continue
+
+    if protection_handled:
+        log.info("Protection plan popup handled successfully")
+        return True
+
+    # 1. Check for iframes first
+    log.debug("Checking for iframes...")
+    frames = page.frames
+    log.debug(f"Found {len(frames)} frames on page")
+
+    # Try to find popup in iframes
+    for i, frame in enumerate(frames):
+        try:
+            frame_url = frame.url
+            log.debug(f"Frame {i}: {frame_url}")
+
+            # Look for protection plan elements in iframe
+            iframe_selectors = [
+                "input[value*='No thanks']",
+                "button:has-text('No thanks')",
+                "input[value*='No Thanks']"
+            ]
+
+            for selector in iframe_selectors:
+                try:
+                    iframe_button = frame.locator(selector).first
+                    if iframe_button.is_visible():
+                        log.info(f"Found popup button in iframe {i}: {selector}")
+                        iframe_button.click()
+                        protection_handled = True
+                        time.sleep(2)
+                        break
+                except:
+                    continue
+
+            if protection_handled:
+                break
+        except:
+            continue
+
+    # 2. Try main page selectors if not found in iframe
+    if not protection_handled:
+        log.debug("Checking main page for popup...")
+
+        # More comprehensive selectors for "No thanks" buttons
+        protection_popup_selectors = [
+            "input[aria-labelledby*='attach-sidesheet-checkout-button']",
+            "input[name='submit.add-to-cart'][value*='No']",
+            "input[value='No thanks']",
+            "button:has-text('No thanks')",
+            "input[value*='No thanks']",
+            ".a-button-text:has-text('No thanks')",
+            "input[aria-label*='No thanks']",
+            "[data-action='attachDisplayAddBaseAlert-declarative_1'] input",
+            "input[name='submit.add-to-cart.top']",
+            ".attach-sidesheet-checkout-button input",
+            "input[data-action='skip-twister']",
+            "input[name='submit.add-to-cart'][value*='No Thanks']",
+            "input[aria-labelledby*='attach-sidesheet-addon-button']",
+            "input[aria-labelledby*='attach-sidesheet-checkout-button-announce']",
+            "input[value*='No Thanks']"
+        ]
+
+        # Wait for popup to be fully loaded
+        time.sleep(2)
+
+        # First, try to find specific "No thanks" buttons
+        for selector in protection_popup_selectors:
+            try:
+                popup_button = page.locator(selector).first
+                if popup_button.is_visible():
+                    button_value = popup_button.get_attribute("value") or ""
+                    button_text = popup_button.inner_text() or ""
+                    log.info(f"Found protection plan button: '{button_value}' '{button_text}' with selector: {selector}")
+
+                    # Try regular click first
+                    try:
+                        popup_button.click()
+                        protection_handled = True
+                    except:
+                        # If regular click fails, try forced click
+                        log.debug("Regular click failed, trying forced click...")
+                        popup_button.click(force=True)
+                        protection_handled = True
+
+                    time.sleep(2)  # Wait for popup to close
+                    break
+            except Exception as e:
+                continue
+
+    # 3. If specific selectors don't work, look for any button with "No" text
+    if not protection_handled:
+        log.debug("Scanning all visible buttons for 'No thanks' text...")
+        try:
+            all_buttons = page.locator("input[type='submit'], button").filter(visible=True)
+            button_count = all_buttons.count()
+            log.debug(f"Checking {button_count} visible buttons for 'No thanks' option...")
+
+            for i in range(button_count):
+                try:
+                    button = all_buttons.nth(i)
+                    button_value = button.get_attribute("value") or ""
+                    button_text = button.inner_text() or ""
+                    aria_label = button.get_attribute("aria-label") or ""
+
+                    # Look for "No thanks", "No", "Skip" etc.
+                    search_text = f"{button_value} {button_text} {aria_label}".lower()
+                    if any(keyword in search_text for keyword in ["no thanks", "no, thanks", "skip", "continue without", "no protection"]):
+                        log.info(f"Found 'No thanks' button: value='{button_value}' text='{button_text}' aria-label='{aria_label}'")
+
+                        # Try regular click first, then forced click
+                        try:
+                            button.click()
+                            protection_handled = True
+                        except:
+                            log.debug("Regular click failed, trying forced click...")
+                            button.click(force=True)
+                            protection_handled = True
+
+                        time.sleep(2)
+                        break
+                except:
+                    continue
+        except:
+            pass
+
+    # 4. Try shadow DOM elements if still not found
+    if not protection_handled:
+        log.debug("Checking for shadow DOM elements...")
+        try:
+            # Look for shadow hosts that might contain the popup
+            shadow_hosts = page.locator("*").filter(has_text="No thanks")
+            shadow_count = shadow_hosts.count()
+            log.debug(f"Found {shadow_count} potential shadow DOM elements")
+
+            for i in range(min(shadow_count, 3)):  # Check first 3
+                try:
+                    shadow_element = shadow_hosts.nth(i)
+                    if shadow_element.is_visible():
+                        log.debug(f"Trying shadow DOM element {i}")
+                        shadow_element.click(force=True)
+                        protection_handled = True
+                        time.sleep(2)
+                        break
+                except:
+                    continue
+        except:
+            pass
+
+    if not protection_handled:
+        # Try to close any visible modals/popups
+        try:
+            close_buttons = page.locator("button[aria-label*='Close'], .a-button-close, [data-action='a-popover-close']")
+            if close_buttons.count() > 0:
+                close_buttons.first.click()
+                log.info("Closed popup using close button")
+                time.sleep(1)
+                protection_handled = True
+        except:
+            pass
+
+    if protection_handled:
+        log.info("Protection plan popup handled successfully")
+        return True
+
+    # A modal that is still open would swallow the clicks of the next stages
+    if page.locator(".a-popover-modal").filter(visible=True).count() > 0:
+        raise StageFailure(FailureKind.SELECTOR_MISS, "Protection plan popup is open but could not be dismissed")
+
+    log.info("No protection plan popup detected or already handled")
+    return False
+
+
+def open_cart(page):
+    # Navigate to shopping cart page
+    log.debug("Navigating to shopping cart")
+
+    # Look for cart navigation options
+    cart_nav_selectors = [
+        "#nav-cart",
+        "#nav-cart-text-container",
+        "a[href*='/cart']",
+        "#sw-atc-details-single-container a[href*='cart']",
+        ".nav-cart-text"
+    ]
+
+    fingerprint, variant = detect_variant(page)
+    cart_nav_found = False
+    for selector in variant.selectors_for("cart_navigation", cart_nav_selectors):
+        try:
+            cart_nav = page.locator(selector).first
+            if cart_nav.is_visible():
+                log.info(f"Found cart navigation with selector: {selector}")
+                cart_nav.click()
+                cart_nav_found = True
+                break
+        except:
+            continue
+
+    if not cart_nav_found:
+        # Try direct navigation to cart page
+        log.info("Direct navigation to cart page...")
+        page.goto(CART_URL)
+
+    # Wait for cart page to load
+    page.wait_for_load_state("load", timeout=10000)
+    time.sleep(2)
+
+    log.info(f"Successfully navigated to cart page: {page.url}")
+
+
+def update_quantity(page, quantity):
+    """Set the cart line quantity; returns whether the new value was verified."""
+    log.debug(f"Updating item quantity to {quantity}")
+
+    # Look for quantity selectors
+    quantity_selectors = [
+        "select[name*='quantity']",
+        "select[data-action='quantity-dropdown']",
+        ".a-dropdown-container select",
+        "select[aria-label*='quantity']",
+        "input[name*='quantity']"
+    ]
+
+    fingerprint, variant = detect_variant(page)
+    quantity_updated = False
+    for selector in variant.selectors_for("quantity", quantity_selectors):
+        try:
+            quantity_element = page.locator(selector).first
+            if quantity_element.is_visible():
+                log.info(f"Found quantity selector: {selector}")
+
+                # Check if it's a dropdown or input
+                element_type = quantity_element.get_attribute("tagName").lower()
+                if element_type == "select":
+                    # For dropdown, select option with the target value
+                    quantity_element.select_option(str(quantity))
+                    log.info(f"Updated quantity to {quantity} via dropdown")
+                elif element_type == "input":
+                    # For input field, clear and type the target value
+                    quantity_element.clear()
+                    quantity_element.fill(str(quantity))
+                    quantity_element.press("Enter")
+                    log.info(f"Updated quantity to {quantity} via input field")
+
+                quantity_updated = True
+                break
+        except Exception as e:
+            continue
+
+    if not quantity_updated and quantity == 2:
+        # Try alternative approach - look for + button
+        log.debug("Looking for quantity increase button...")
+        plus_button_selectors = [
+            "button[aria-label*='Increase']",
+            "button[data-action='plus']",
+            ".a-button-input[value='+']",
+            "input[value='+']"
+        ]
+
+        for selector in variant.selectors_for("quantity_plus", plus_button_selectors):
+            try:
+                plus_button = page.locator(selector).first
+                if plus_button.is_visible():
+                    log.info(f"Found quantity increase button: {selector}")
+                    plus_button.click()  # Click once to go from 1 to 2
+                    log.info("Updated quantity to 2 via plus button")
+                    quantity_updated = True
+                    break
+            except:
+                continue
+
+    if not quantity_updated:
+        log.error("Could not find quantity update controls")
+        log.debug("Available cart elements:")
+        # Debug: show available elements
+        cart_elements = page.locator("select, input, button").filter(visible=True)
+        for i in range(min(cart_elements.count(), 5)):
+            try:
+                element = cart_elements.nth(i)
+                tag = element.get_attribute("tagName")
+                name = element.get_attribute("name") or ""
+                aria_label = element.get_attribute("aria-label") or ""
+                log.debug(f"{tag}: name='{name}' aria-label='{aria_label[:30]}'")
+            except:
+                pass
+        raise StageFailure(FailureKind.SELECTOR_MISS, "Could not find quantity update controls")
+
+    # Wait for page to update
+    time.sleep(3)
+
+    # Verify quantity change
+    log.debug("Verifying quantity update")
+
+    # Look for quantity confirmation
+    verification_selectors = [
+        "select[name*='quantity'] option[selected]",
+        "input[name*='quantity']",
+        ".a-dropdown-prompt",
+        f"[data-item-count='{quantity}']"
+    ]
+
+    quantity_verified = False
+    for selector in verification_selectors:
+        try:
+            element = page.locator(selector).first
+            if element.is_visible():
+                value = element.get_attribute("value") or element.inner_text()
+                if str(quantity) in str(value):
+                    log.info(f"Quantity verified as {quantity}: {value}")
+                    quantity_verified = True
+                    break
+        except:
+            continue
+
+    if not quantity_verified:
+        log.warning("Could not verify quantity update")
+
+    log.info("Shopping cart operations completed")
+    return quantity_verified
+
+
+def parse_price(text):
+    # Extract numeric value from price text
+    match = re.search(r'[\d,]+\.?\d*', text.replace('$', ''))
+    if match:
+        return float(match.group().replace(',', ''))
+    return None
+
+
+def read_cart_item_price(page):
+    # Get item price from cart for calculation validation
+    price_selectors = [
+        ".a-price-whole",
+        ".a-offscreen[data-automation-id*='price']",
+        ".a-price .a-offscreen",
+        "[data-automation-id='unit-price'] .a-offscreen"
+    ]
+
+    for selector in price_selectors:
+        try:
+            price_element = page.locator(selector).first
+            if price_element.is_visible():
+                item_price = parse_price(price_element.inner_text().strip())
+                if item_price is not None:
+                    log.info(f"Item price extracted: ${item_price}")
+                    return item_price
+        except:
+            continue
+
+    log.info("Could not extract item price from cart")
+    return None
+
+
+def proceed_to_checkout(page):
+    log.debug("Proceeding to checkout")
+
+    # Look for "Proceed to Checkout" button
+    checkout_selectors = [
+        "input[name='proceedToRetailCheckout']",
+        "button[name='proceedToRetailCheckout']",
+        "input[aria-labelledby*='checkout']",
+        "input[value*='Proceed to checkout']",
+        ".a-button-input[aria-labelledby*='checkout']",
+        "input[data-feature-id='proceed-to-checkout-action']"
+    ]
+
+    fingerprint, variant = detect_variant(page)
+    checkout_nav_found = False
+    for selector in variant.selectors_for("checkout", checkout_selectors):
+        try:
+            checkout_button = page.locator(selector).first
+            if checkout_button.is_visible():
+                log.info(f"Found checkout button with selector: {selector}")
+                checkout_button.click()
+                checkout_nav_found = True
+                break
+        except:
+            continue
+
+    if not checkout_nav_found:
+        log.error("Could not find 'Proceed to Checkout' button")
+        log.debug("Available cart buttons:")
+        # Debug: show available buttons
+        cart_buttons = page.locator("input, button").filter(visible=True)
+        for i in range(min(cart_buttons.count(), 5)):
+            try:
+                button = cart_buttons.nth(i)
+                button_text = button.inner_text() or button.get_attribute("value") or ""
+                if button_text:
+                    log.debug(f"Button {i+1}: '{button_text[:50]}'")
+            except:
+                pass
+        raise StageFailure(FailureKind.SELECTOR_MISS, "Could not find 'Proceed to Checkout' button")
+
+    # Wait for checkout page to load
+    log.info("Waiting for checkout page to load...")
+    page.wait_for_load_state("load", timeout=15000)
+    time.sleep(3)
+
+    log.info(f"Successfully navigated to checkout: {page.url}")
+
+    # Handle potential sign-in requirements or guest checkout
+    log.debug("Handling checkout prerequisites")
+
+    # Check if we need to sign in or can proceed as guest
+    signin_indicators = [
+        "#ap_email",
+        "input[name='email']",
+        ".a-spacing-large:has-text('Sign in')",
+        "#continue-as-guest-button",
+        "input[aria-label*='email']"
+    ]
+
+    signin_required = False
+    for selector in signin_indicators:
+        try:
+            if page.locator(selector).count() > 0:
+                signin_required = True
+                log.info(f"Sign-in page detected with: {selector}")
+                break
+        except:
+            continue
+
+    if signin_required:
+        # Try to find guest checkout option
+        guest_checkout_selectors = [
+            "#continue-as-guest-button",
+            "input[name='continue-as-guest']",
+            "a[href*='guest']",
+            ".a-button-text:has-text('Continue as guest')"
+        ]
+
+        guest_checkout_found = False
+        for selector in guest_checkout_selectors:
+            try:
+                guest_button = page.locator(selector).first
+                if guest_button.is_visible():
+                    log.info(f"Found guest checkout option: {selector}")
+                    guest_button.click()
+                    guest_checkout_found = True
+                    page.wait_for_load_state("load", timeout=10000)
+                    time.sleep(2)
+                    break
+            except:
+                continue
+
+        if not guest_checkout_found:
+            log.warning("Sign-in required but no guest checkout option found")
+            log.info("Checkout validation limited due to authentication requirements")
+    else:
+        log.info("Proceeding with checkout (no sign-in required)")
+
+
+def validate_grand_total(page, item_price, quantity):
+    # Locate and validate grand total
+    log.debug("Validating grand total calculation")
+
+    total_selectors = [
+        "#grand-total-price",
+        ".grand-total-price .a-offscreen",
+        "[data-automation-id='order-total'] .a-offscreen",
+        ".a-row.a-spacing-none.checkout-order-total .a-offscreen",
+        ".order-total .a-price .a-offscreen",
+        "#subtotals-marketplace-table .grand-total-price"
+    ]
+
+    fingerprint, variant = detect_variant(page)
+    grand_total = None
+    for selector in variant.selectors_for("grand_total", total_selectors):
+        try:
+            total_element = page.locator(selector).first
+            if total_element.is_visible():
+                grand_total = parse_price(total_element.inner_text().strip())
+                if grand_total is not None:
+                    log.info(f"Grand total found: ${grand_total}")
+                    break
+        except:
+            continue
+
+    if grand_total and item_price:
+        # Validate calculation: item price × quantity = expected total
+        expected_subtotal = item_price * quantity
+        log.info(f"Expected subtotal (${item_price} × {quantity}): ${expected_subtotal}")
+
+        # Allow for taxes, shipping, etc. - check if total is reasonable
+        if grand_total >= expected_subtotal:
+            if grand_total <= expected_subtotal * 1.5:  # Allow up to 50% markup for taxes/shipping
+                log.info(
+                    "Grand total validation successful",
+                    item_price=item_price,
+                    quantity=quantity,
+                    expected_subtotal=expected_subtotal,
+                    grand_total=grand_total,
+                    difference=round(grand_total - expected_subtotal, 2),
+                )
+            else:
+                log.warning(
+                    f"Grand total seems unusually high: expected ~${expected_subtotal}, got ${grand_total}",
+                    expected_subtotal=expected_subtotal,
+                    grand_total=grand_total,
+                )
+        else:
+            log.error(
+                f"Grand total validation failed: ${grand_total} is less than expected subtotal ${expected_subtotal}",
+                expected_subtotal=expected_subtotal,
+                grand_total=grand_total,
+            )
+    elif grand_total:
+        log.info(f"Grand total located: ${grand_total}")
+        log.warning("Could not validate calculation (item price not available)")
+    elif item_price:
+        log.info(f"Item price available: ${item_price}")
+        log.error("Could not locate grand total on checkout page")
+        # Debug: show available price elements
+        log.debug("Available price elements:")
+        price_elements = page.locator(".a-price, .a-offscreen, [class*='total'], [class*='price']").filter(visible=True)
+        for i in range(min(price_elements.count(), 5)):
+            try:
+                element = price_elements.nth(i)
+                text = element.inner_text().strip()
+                if text and '$' in text:
+                    log.debug(f"Price element {i+1}: '{text}'")
+            except:
+                pass
+    else:
+        log.error("Could not extract price information for validation")
+
+    log.info("Checkout process and validation completed")
+    return grand_total
@@ -0,0 +1,81 @@
+"""Bot-wall checks and quarantine bookkeeping.
+
+A test that runs into a bot wall is reported as *quarantined* (a skip)
+rather than failed: the product flow was never exercised. The report
+counts walls per worker and egress address, so a runner or IP that keeps
+getting walled stands out.
+"""
+import json
+import os
+import socket
+from collections import Counter, defaultdict
+
+from utils.fingerprint import detect_variant
+
+# user_properties key marking a test as quarantined
+QUARANTINE_PROPERTY = "quarantined"
+
+
+def check_page(page, response=None):
+    """Raise ``BotWall`` if ``page`` currently shows a bot wall."""
+    detect_variant(page, response)
+
+
+def worker_identity():
+    """Return ``(worker, address)`` used to attribute bot walls.
+
+    The egress IP is not visible from inside the browser, so CI can pass
+    it in through EGRESS_IP; otherwise the host name is used.
+    """
+    worker = os.getenv("PYTEST_XDIST_WORKER", "master")
+    address = os.getenv("EGRESS_IP") or socket.gethostname()
+    return worker, address
+
+
+def quarantine_record(wall, stage):
+    worker, address = worker_identity()
+    return {
+        "reason": wall.reason,
+        "url": wall.url,
+        "stage": stage,
+        "worker": worker,
+        "address": address,
+    }
+
+
+class QuarantineReport:
+    """Session-wide record of quarantined tests and bot-wall frequency."""
+
+    def __init__(self):
+        self.tests = []
+        self.by_worker = defaultdict(Counter)
+
+    def add(self, nodeid, record):
+        self.tests.append((nodeid, record))
+        self.by_worker[(record["worker"], record["address"])][record["reason"]] += 1
+
+    def __bool__(self):
+        return bool(self.tests)
+
+    def format_lines(self):
+        lines = []
+        for (worker, address), reasons in sorted(self.by_worker.items()):
+            detail = ", ".join(f"{reason} x{count}" for reason, count in reasons.most_common())
+            lines.append(f"{worker} @ {address}: walled {sum(reasons.values())} time(s) ({detail})")
+        for nodeid, record in self.tests:
+            lines.append(f"  {nodeid} at '{record['stage']}': {record['reason']} ({record['url']})")
+        return lines
+
+    def write_json(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "walls": [
+                {"worker": worker, "address": address, "reasons": dict(reasons)}
+                for (worker, address), reasons in sorted(self.by_worker.items())
+            ],
+            "tests": [dict(record, nodeid=nodeid) for nodeid, record in self.tests],
+        }
+        with open(path, "w") as fh:
+            json.dump(data, fh, indent=2)
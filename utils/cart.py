@@ -0,0 +1,101 @@
+"""Cart state seeding.
+
+Puts items straight into the cart of the browser context and lands on the
+cart page, so cart and checkout tests skip the search, product page,
+add-to-cart and popup stages.
+
+Two ways to add the items:
+
+* replay a captured add-to-cart request (CART_SEED_CAPTURE, a JSON file
+  with ``url``, ``method``, ``headers`` and ``form`` or ``body``, where
+  ``{asin}`` and ``{quantity}`` are substituted per item) through the
+  context's request API, which shares cookies with the page;
+* otherwise submit the storefront's add-to-cart form URL
+  (``/gp/aws/cart/add.html?ASIN.1=...&Quantity.1=...``), which a local
+  stand-in can serve as its cart endpoint.
+"""
+import json
+import os
+from urllib.parse import urlencode
+
+from utils.amazon_flow import BASE_URL, CART_URL
+from utils.events import log
+from utils.fingerprint import PROBES, detect_variant
+from utils.retry import FailureKind, StageFailure
+
+
+def add_form_url(items):
+    params = {}
+    for index, (asin, quantity) in enumerate(items, start=1):
+        params[f"ASIN.{index}"] = asin
+        params[f"Quantity.{index}"] = quantity
+    return f"{BASE_URL}/gp/aws/cart/add.html?{urlencode(params)}"
+
+
+def load_capture(path):
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _fill(value, asin, quantity):
+    return str(value).replace("{asin}", asin).replace("{quantity}", str(quantity))
+
+
+def replay_capture(page, capture, items):
+    """Replay a captured add-to-cart request once per item."""
+    for asin, quantity in items:
+        options = {
+            "method": capture.get("method", "POST"),
+            "headers": {k: _fill(v, asin, quantity) for k, v in capture.get("headers", {}).items()},
+        }
+        if "form" in capture:
+            options["form"] = {k: _fill(v, asin, quantity) for k, v in capture["form"].items()}
+        elif "body" in capture:
+            options["data"] = _fill(capture["body"], asin, quantity)
+
+        response = page.context.request.fetch(_fill(capture["url"], asin, quantity), **options)
+        if not response.ok:
+            raise StageFailure(
+                FailureKind.ERROR,
+                f"Replayed add-to-cart for {asin} returned HTTP {response.status}",
+            )
+        log.debug(f"Replayed add-to-cart for {asin} x{quantity}", status=response.status)
+
+
+def submit_add_form(page, items):
+    """Add all items in one request through the add-to-cart form URL."""
+    response = page.goto(add_form_url(items))
+    page.wait_for_load_state("load", timeout=10000)
+    detect_variant(page, response)
+
+    # Amazon asks to confirm the items on this page; a stand-in may add them directly
+    confirm_button = page.locator("input[name='add']").first
+    if confirm_button.count() > 0 and confirm_button.is_visible():
+        confirm_button.click()
+        page.wait_for_load_state("load", timeout=10000)
+
+
+def seed_cart(page, items):
+    """Add ``items`` (``[(asin, quantity), ...]``) and open the cart page.
+
+    Not idempotent: running it twice adds the items twice, so it must not
+    run as a retried stage (``stages.run(..., retry=False)``).
+    """
+    capture_path = os.getenv("CART_SEED_CAPTURE")
+    if capture_path:
+        log.info(f"Seeding cart by replaying {capture_path}", items=items)
+        replay_capture(page, load_capture(capture_path), items)
+    else:
+        log.info("Seeding cart through the add-to-cart form", items=items)
+        submit_add_form(page, items)
+
+    response = page.goto(CART_URL)
+    page.wait_for_load_state("load", timeout=10000)
+    detect_variant(page, response)
+
+    # Saved-for-later rows and carousels carry data-asin too; only the active cart counts
+    for asin, _ in items:
+        in_cart = page.locator(f"{PROBES['active_cart']} [data-asin='{asin}']")
+        assert in_cart.count() > 0, f"Seeded item {asin} is not in the active cart"
+    log.info(f"Cart seeded with {len(items)} item(s): {page.url}")
+    return page
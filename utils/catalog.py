@@ -0,0 +1,33 @@
+"""Products the suite searches for."""
+import json
+
+
+class Product:
+    """A search term and the keywords a matching result must contain.
+
+    ``asin`` is optional; it lets cart tests seed the cart with the product
+    instead of finding it through search.
+    """
+
+    def __init__(self, term, keywords=None, asin=None):
+        self.term = term
+        self.keywords = tuple(k.lower() for k in (keywords or term.split()))
+        self.asin = asin
+
+    def __repr__(self):
+        return f"<Product {self.term!r}>"
+
+
+DEFAULT_CATALOG = [Product("Apple AirPods Max", keywords=("apple", "airpods"), asin="B08PZHYWJS")]
+
+
+def load_catalog(path=None):
+    """Load products from a JSON list of ``{"term": ..., "keywords": [...], "asin": ...}``.
+
+    Without a path the default single-product catalog is used.
+    """
+    if not path:
+        return list(DEFAULT_CATALOG)
+    with open(path, encoding="utf-8") as fh:
+        entries = json.load(fh)
+    return [Product(entry["term"], entry.get("keywords"), entry.get("asin")) for entry in entries]
@@ -0,0 +1,147 @@
+"""Structured, non-blocking event log.
+
+``log.info(...)`` and friends only build a dict and put it on a queue; a
+background thread writes the events as JSON lines (one file per xdist
+worker) and optionally echoes them to the console. Events of the running
+test are also kept in memory so they can be replayed into the HTML report
+as a per-test timeline.
+"""
+import html
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+_LEVEL_MARKERS = {"debug": " ", "info": "·", "warning": "!", "error": "✗"}
+
+_STOP = object()
+
+
+class EventLogger:
+    def __init__(self):
+        self.level = LEVELS["info"]
+        self.context = {}
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._file = None
+        self._echo = True
+        self._test_events = None
+
+    def configure(self, path=None, level="info", echo=True):
+        """Start the writer thread; ``path`` is the JSON lines file, if any."""
+        self.close()
+        if level not in LEVELS:
+            raise ValueError(f"Unknown event log level {level!r}; expected one of {', '.join(LEVELS)}")
+        self.level = LEVELS[level]
+        self._echo = echo
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._write_loop, name="event-log-writer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Drain the queue and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def emit(self, level, message, **fields):
+        if LEVELS[level] < self.level:
+            return
+        event = {"ts": time.time(), "level": level, **self.context, "message": message}
+        if fields:
+            event["fields"] = fields
+        if self._test_events is not None:
+            self._test_events.append(event)
+        if self._thread is None:
+            # Not configured (e.g. helpers used outside pytest): write inline
+            self._write(event)
+        else:
+            self._queue.put(event)
+
+    def debug(self, message, **fields):
+        self.emit("debug", message, **fields)
+
+    def info(self, message, **fields):
+        self.emit("info", message, **fields)
+
+    def warning(self, message, **fields):
+        self.emit("warning", message, **fields)
+
+    def error(self, message, **fields):
+        self.emit("error", message, **fields)
+
+    def begin_test(self, nodeid):
+        self.context = {"worker": self.context.get("worker"), "test": nodeid}
+        self._test_events = []
+
+    def test_events(self):
+        return list(self._test_events or [])
+
+    def end_test(self):
+        self.context = {"worker": self.context.get("worker")}
+        self._test_events = None
+
+    def _write_loop(self):
+        while True:
+            event = self._queue.get()
+            if event is _STOP:
+                break
+            self._write(event)
+        if self._file is not None:
+            self._file.flush()
+
+    def _write(self, event):
+        if self._file is not None:
+            self._file.write(json.dumps(event, default=str) + "\n")
+        if self._echo:
+            sys.stdout.write(format_event(event) + "\n")
+            sys.stdout.flush()
+
+
+def format_event(event):
+    stage = f"[{event['stage']}] " if event.get("stage") else ""
+    line = f"{_LEVEL_MARKERS[event['level']]} {stage}{event['message']}"
+    fields = event.get("fields")
+    if fields:
+        line += " (" + ", ".join(f"{key}={value}" for key, value in fields.items()) + ")"
+    return line
+
+
+def timeline_html(events):
+    """Render the events of one test as an HTML table for pytest-html."""
+    if not events:
+        return ""
+    started = events[0]["ts"]
+    rows = []
+    for event in events:
+        fields = event.get("fields")
+        detail = html.escape(json.dumps(fields, default=str)) if fields else ""
+        rows.append(
+            f"<tr class='event-{event['level']}'>"
+            f"<td>+{event['ts'] - started:.2f}s</td>"
+            f"<td>{event['level']}</td>"
+            f"<td>{html.escape(event.get('stage') or '')}</td>"
+            f"<td>{html.escape(event['message'])}</td>"
+            f"<td>{detail}</td></tr>"
+        )
+    return (
+        "<table class='event-timeline'>"
+        "<tr><th>time</th><th>level</th><th>stage</th><th>event</th><th>fields</th></tr>"
+        + "".join(rows)
+        + "</table>"
+    )
+
+
+log = EventLogger()
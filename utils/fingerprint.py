@@ -0,0 +1,273 @@
+"""Structural page fingerprinting.
+
+One ``page.evaluate`` call records which of a fixed set of CSS probes are
+present (and visible) on the page. The result is matched against the
+known Amazon layout variants, and each variant carries the selectors
+that work on it, so a stage can try those first instead of probing the
+full fallback list one timeout at a time.
+
+Bot walls (CAPTCHA, robot check, "Sorry" and 503 pages) are variants too:
+``detect_variant`` raises ``BotWall`` for them, so a stage stops at the
+navigation that was walled instead of timing out on selectors that can
+never match.
+"""
+from urllib.parse import urlparse
+
+from utils.events import log
+from utils.retry import BotWall, describe_failure
+
+# Plain CSS only: the probes run through document.querySelector
+PROBES = {
+    "captcha_form": "form[action*='validateCaptcha']",
+    "search_box": "#twotabsearchtextbox",
+    "search_result": "[data-component-type='s-search-result']",
+    "search_result_testid": "[data-testid='s-search-result']",
+    "product_title": "#productTitle",
+    "add_to_cart_button": "#add-to-cart-button",
+    "add_to_cart_input": "input[name='submit.add-to-cart']",
+    "buy_now_button": "#buy-now-button",
+    "attach_sidesheet": "#attach-desktop-sideSheet",
+    "attach_base_alert": "#attachDisplayAddBaseAlert",
+    "attach_no_coverage": "#attachSiNoCoverage",
+    "popover_modal": ".a-popover-modal",
+    "smart_wagon": "#sw-atc-details-single-container",
+    "active_cart": "#sc-active-cart",
+    "quantity_select": "select[name*='quantity']",
+    "quantity_plus": "button[aria-label*='Increase']",
+    "checkout_button": "input[name='proceedToRetailCheckout']",
+    "signin_email": "#ap_email",
+    "grand_total": "#grand-total-price",
+}
+
+FINGERPRINT_SCRIPT = """
+(probes) => {
+    const present = [];
+    const visible = [];
+    for (const [name, selector] of Object.entries(probes)) {
+        let element = null;
+        try {
+            element = document.querySelector(selector);
+        } catch (e) {
+            continue;
+        }
+        if (!element) continue;
+        present.push(name);
+        const style = window.getComputedStyle(element);
+        if (element.getClientRects().length > 0 && style.visibility !== "hidden") {
+            visible.push(name);
+        }
+    }
+    const navigation = performance.getEntriesByType("navigation")[0];
+    const status = navigation && navigation.responseStatus ? navigation.responseStatus : null;
+    return {path: location.pathname, title: document.title, status, present, visible};
+}
+"""
+
+
+class PageFingerprint:
+    def __init__(self, path, title, present, visible, status=None):
+        self.path = path
+        self.title = title
+        self.status = status
+        self.present = frozenset(present)
+        self.visible = frozenset(visible)
+
+    def has(self, *probes):
+        return all(probe in self.present for probe in probes)
+
+    def shows(self, *probes):
+        return all(probe in self.visible for probe in probes)
+
+    def signature(self):
+        return f"{self.path}|{','.join(sorted(self.present))}"
+
+
+class Variant:
+    """A known page layout and the selectors to use on it, per step."""
+
+    def __init__(self, name, matches, selectors=None, expects_popup=None, bot_wall=False, skip=()):
+        self.name = name
+        self.matches = matches
+        self.selectors = selectors or {}
+        # Steps whose generic probes cannot match on this layout
+        self.skip = frozenset(skip)
+        # None: unknown, probe for it; False: this layout never shows one
+        self.expects_popup = expects_popup
+        self.bot_wall = bot_wall
+
+    def selectors_for(self, step, fallback=()):
+        """Variant selectors for ``step`` first, then the generic fallbacks.
+
+        Steps in ``skip`` get the variant's own selectors only.
+        """
+        ordered = list(self.selectors.get(step, []))
+        if step in self.skip:
+            return ordered
+        ordered.extend(selector for selector in fallback if selector not in ordered)
+        return ordered
+
+    def __repr__(self):
+        return f"<Variant {self.name}>"
+
+
+def _is_product_path(path):
+    return "/dp/" in path or "/gp/product/" in path or "/gp/aw/d/" in path
+
+
+def is_product_page(fingerprint):
+    return _is_product_path(fingerprint.path) or fingerprint.has("product_title")
+
+
+# Order matters: the first matching variant wins
+VARIANTS = [
+    Variant(
+        "captcha",
+        lambda fp: fp.has("captcha_form"),
+        bot_wall=True,
+    ),
+    Variant(
+        "robot_check",
+        lambda fp: "robot check" in fp.title.lower(),
+        bot_wall=True,
+    ),
+    Variant(
+        "service_unavailable",
+        lambda fp: fp.status == 503 or "service unavailable" in fp.title.lower(),
+        bot_wall=True,
+    ),
+    Variant(
+        "sorry_page",
+        lambda fp: fp.title.lower().startswith("sorry"),
+        bot_wall=True,
+    ),
+    Variant(
+        "search_results",
+        lambda fp: fp.has("search_result") or fp.has("search_result_testid"),
+    ),
+    Variant(
+        "atc_smart_wagon",
+        lambda fp: fp.has("smart_wagon"),
+        selectors={
+            "cart_confirmation": ["#sw-atc-details-single-container"],
+            "cart_navigation": ["#sw-gtc a", "#sw-atc-details-single-container a[href*='cart']"],
+        },
+        expects_popup=False,
+    ),
+    Variant(
+        "atc_sidesheet",
+        lambda fp: fp.shows("attach_sidesheet") or fp.shows("attach_base_alert"),
+        selectors={
+            "cart_confirmation": ["#attachDisplayAddBaseAlert", "[data-feature-name='addToCart']"],
+            "protection_popup": [
+                "#attachSiNoCoverage input",
+                "input[aria-labelledby*='attach-sidesheet-checkout-button']",
+                ".attach-sidesheet-checkout-button input",
+            ],
+            "cart_navigation": ["#attach-sidesheet-view-cart-button input", "#nav-cart"],
+        },
+        expects_popup=True,
+    ),
+    Variant(
+        "atc_modal",
+        lambda fp: fp.shows("popover_modal") and fp.has("attach_no_coverage"),
+        selectors={
+            "protection_popup": [
+                "#attachSiNoCoverage input",
+                ".a-popover-modal input[value*='No thanks']",
+                "[data-action='a-popover-close']",
+            ],
+        },
+        expects_popup=True,
+    ),
+    # #add-to-cart-button leads the generic add-to-cart list already
+    Variant(
+        "product_dp",
+        lambda fp: "/dp/" in fp.path and fp.has("add_to_cart_button"),
+    ),
+    Variant(
+        "product_gp",
+        lambda fp: _is_product_path(fp.path) and fp.has("add_to_cart_button"),
+    ),
+    Variant(
+        "product_atc_input",
+        lambda fp: is_product_page(fp) and fp.has("add_to_cart_input"),
+        selectors={"add_to_cart": ["input[name='submit.add-to-cart']"]},
+    ),
+    # No selector set of its own: Buy Now skips the cart, so it stays the
+    # late fallback of the generic add-to-cart list
+    Variant("product_no_cart_button", is_product_page),
+    Variant(
+        "cart_dropdown",
+        lambda fp: (fp.has("active_cart") or "/cart" in fp.path) and fp.has("quantity_select"),
+        skip=("quantity_plus",),
+        expects_popup=False,
+    ),
+    Variant(
+        "cart_stepper",
+        lambda fp: (fp.has("active_cart") or "/cart" in fp.path) and fp.has("quantity_plus"),
+        # No dropdown to probe: go straight to the plus button
+        skip=("quantity",),
+        expects_popup=False,
+    ),
+    Variant(
+        "signin",
+        lambda fp: fp.has("signin_email"),
+    ),
+    Variant(
+        "checkout",
+        lambda fp: "/checkout" in fp.path or fp.has("grand_total"),
+    ),
+]
+
+UNKNOWN = Variant("unknown", lambda fp: True)
+
+
+def classify(fingerprint):
+    for variant in VARIANTS:
+        if variant.matches(fingerprint):
+            return variant
+    return UNKNOWN
+
+
+def fingerprint_page(page):
+    """Fingerprint ``page`` in a single evaluate call.
+
+    A page still navigating (e.g. the smart wagon redirect after Add to
+    Cart) can destroy the execution context under the evaluate; that
+    yields an empty fingerprint, which classifies as ``UNKNOWN``.
+    """
+    try:
+        page.wait_for_load_state("domcontentloaded", timeout=10000)
+        data = page.evaluate(FINGERPRINT_SCRIPT, PROBES)
+    except Exception as e:
+        # Imported here so this module never loads playwright on its own
+        from playwright.sync_api import Error as PlaywrightError
+        if not isinstance(e, PlaywrightError):
+            raise
+        log.debug(f"Fingerprint unavailable: {describe_failure(e)}", url=page.url)
+        return PageFingerprint(urlparse(page.url).path, "", [], [])
+    return PageFingerprint(data["path"], data["title"], data["present"], data["visible"], data["status"])
+
+
+def detect_variant(page, response=None):
+    """Fingerprint ``page`` and return ``(fingerprint, variant)``.
+
+    ``response`` is the ``Response`` of the navigation that loaded the
+    page (what ``page.goto`` returns); its status is used over the
+    navigation timing entry, which WebKit does not fill in.
+
+    Raises ``BotWall`` when the page is a bot wall.
+    """
+    fingerprint = fingerprint_page(page)
+    if response is not None:
+        fingerprint.status = response.status
+    variant = classify(fingerprint)
+    if variant.bot_wall:
+        log.warning(f"Bot wall detected: {variant.name}", url=page.url, status=fingerprint.status)
+        raise BotWall(variant.name, page.url)
+    if variant is UNKNOWN:
+        # Worth adding to VARIANTS if it keeps showing up
+        log.info("Page variant: unknown", signature=fingerprint.signature())
+    else:
+        log.debug(f"Page variant: {variant.name}", path=fingerprint.path)
+    return fingerprint, variant
@@ -0,0 +1,234 @@
+"""DOM-only search precheck.
+
+Fetches the search results HTML with a plain HTTP client (or reads it from
+a replay archive) and runs the search assertions of the browser flow on
+it: at least ``MIN_RESULTS`` results, one of the first ``MATCH_WINDOW``
+matching the product keywords. No browser is launched, so a large
+catalog can be screened cheaply before the browser stages run.
+
+The parser is the standard library's streaming ``html.parser``: it only
+tracks the search result containers and stops collecting text once the
+match window is filled.
+"""
+import os
+import re
+from html.parser import HTMLParser
+
+from utils.amazon_flow import MATCH_WINDOW, MIN_RESULTS, matches_product, search_url
+from utils.events import log
+from utils.retry import BotWall
+
+REQUEST_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/126.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+VOID_ELEMENTS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+})
+
+_cache = {}
+
+
+def precheck_enabled():
+    return os.getenv("PRECHECK", "false").lower() == "true"
+
+
+class _SearchResultParser(HTMLParser):
+    def __init__(self, capture_limit):
+        super().__init__(convert_charrefs=True)
+        self.capture_limit = capture_limit
+        self.count = 0
+        self.texts = []
+        self.title = ""
+        self.has_captcha_form = False
+        # Tags open inside the current result; empty outside results
+        self._open = []
+        self._chunks = None
+        self._in_title = False
+        self._skip_text = 0
+
+    def handle_starttag(self, tag, attrs):
+        self._inspect(tag, attrs)
+        if tag in VOID_ELEMENTS:
+            return
+        if tag in ("script", "style"):
+            self._skip_text += 1
+        attrs = dict(attrs)
+        if (attrs.get("data-component-type") == "s-search-result"
+                or attrs.get("data-testid") == "s-search-result"):
+            # Results are never nested: a new one ends the previous one
+            self._finish_result()
+            self.count += 1
+            self._open = [tag]
+            self._chunks = [] if len(self.texts) < self.capture_limit else None
+        elif self._open:
+            self._open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._inspect(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        if tag in ("script", "style") and self._skip_text:
+            self._skip_text -= 1
+        if tag not in self._open:
+            return
+        # Elements closed implicitly (<p>, <li>, <td>, ...) are popped with it
+        while self._open.pop() != tag:
+            pass
+        if not self._open:
+            self._finish_result()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        if self._chunks is not None and not self._skip_text:
+            text = data.strip()
+            if text:
+                self._chunks.append(text)
+
+    def close(self):
+        super().close()
+        self._finish_result()
+
+    def _finish_result(self):
+        if self._chunks is not None:
+            self.texts.append(" ".join(self._chunks))
+        self._chunks = None
+        self._open = []
+
+    def _inspect(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        elif tag == "form" and "validateCaptcha" in (dict(attrs).get("action") or ""):
+            self.has_captcha_form = True
+
+
+class SearchPrecheck:
+    """Outcome of the DOM-only search checks for one product.
+
+    ``error`` is set when the search page could not be fetched at all.
+    """
+
+    def __init__(self, product, source, count, texts, error=None):
+        self.product = product
+        self.source = source
+        self.count = count
+        self.texts = texts
+        self.error = error
+        self.match_index = next(
+            (i for i, text in enumerate(texts) if matches_product(text, product.keywords)),
+            None,
+        )
+
+    @property
+    def failure(self):
+        if self.error is not None:
+            return f"Could not fetch the search page: {self.error}"
+        if self.count < MIN_RESULTS:
+            return f"Expected at least {MIN_RESULTS} search results but found {self.count}"
+        if self.match_index is None:
+            return (
+                f"None of the first {MATCH_WINDOW} results for {self.product.term!r} "
+                f"contains {', '.join(self.product.keywords)}"
+            )
+        return None
+
+    @property
+    def passed(self):
+        return self.failure is None
+
+
+def _replay_path(replay_dir, term):
+    slug = re.sub(r"[^a-z0-9]+", "-", term.lower()).strip("-")
+    return os.path.join(replay_dir, f"{slug}.html")
+
+
+def fetch_search_html(term, timeout=10):
+    """Return ``(source, html)`` from the replay archive or over HTTP.
+
+    PRECHECK_REPLAY_DIR holds ``<search-term-slug>.html`` captures;
+    otherwise the search page is requested from AMAZON_BASE_URL.
+    """
+    replay_dir = os.getenv("PRECHECK_REPLAY_DIR")
+    if replay_dir:
+        path = _replay_path(replay_dir, term)
+        with open(path, encoding="utf-8") as fh:
+            return path, fh.read()
+
+    # urllib.request pulls in http.client, email and ssl; only load it when fetching
+    import urllib.error
+    import urllib.request
+
+    url = search_url(term)
+    request = urllib.request.Request(url, headers=REQUEST_HEADERS)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            charset = response.headers.get_content_charset() or "utf-8"
+            body = response.read()
+    except urllib.error.HTTPError as e:
+        if e.code == 503:
+            raise BotWall("service_unavailable", url) from e
+        raise
+    try:
+        return url, body.decode(charset, errors="replace")
+    except LookupError:
+        # The server named a charset Python does not know
+        return url, body.decode("utf-8", errors="replace")
+
+
+def parse_search_html(product, source, html):
+    parser = _SearchResultParser(capture_limit=MATCH_WINDOW)
+    parser.feed(html)
+    parser.close()
+
+    title = parser.title.strip().lower()
+    if parser.has_captcha_form:
+        raise BotWall("captcha", source)
+    if "robot check" in title:
+        raise BotWall("robot_check", source)
+    if title.startswith("sorry"):
+        raise BotWall("sorry_page", source)
+    return SearchPrecheck(product, source, parser.count, parser.texts)
+
+
+def run_precheck(product):
+    """Run (or reuse) the DOM-only search precheck for ``product``.
+
+    Raises ``BotWall`` when the fetched page is a bot wall. A page that
+    cannot be fetched (missing replay file, network or encoding error) is
+    recorded as a result with ``error`` set.
+    """
+    if product.term in _cache:
+        cached = _cache[product.term]
+        if isinstance(cached, BotWall):
+            raise cached
+        return cached
+
+    try:
+        source, html = fetch_search_html(product.term)
+        result = parse_search_html(product, source, html)
+    except BotWall as wall:
+        wall.stage = "precheck"
+        log.warning(f"Precheck for {product.term!r} hit a bot wall: {wall.reason}", url=wall.url)
+        _cache[product.term] = wall
+        raise
+    except (OSError, UnicodeError) as e:
+        result = SearchPrecheck(product, None, 0, [], error=f"{type(e).__name__}: {e}")
+
+    if result.passed:
+        log.info(
+            f"Precheck passed for {product.term!r}",
+            source=source, results=result.count, match_index=result.match_index,
+        )
+    else:
+        log.warning(f"Precheck failed for {product.term!r}: {result.failure}", source=result.source)
+    _cache[product.term] = result
+    return result
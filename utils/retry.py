@@ -0,0 +1,244 @@
+"""Stage-level retry policy with page checkpoints."""
+import os
+import sys
+import time
+from collections import Counter
+
+from utils.events import log
+
+# user_properties key used to ship stage attempts from workers to the controller
+STAGE_ATTEMPTS_PROPERTY = "stage_attempts"
+
+
+class FailureKind:
+    TIMEOUT = "timeout"
+    SELECTOR_MISS = "selector_miss"
+    BOT_WALL = "bot_wall"
+    ASSERTION = "assertion"
+    ERROR = "error"
+
+
+class StageFailure(Exception):
+    """A flow stage could not complete; ``kind`` is one of FailureKind."""
+
+    def __init__(self, kind, message):
+        super().__init__(f"[{kind}] {message}")
+        self.kind = kind
+        self.message = message
+
+
+class BotWall(StageFailure):
+    """The page is a CAPTCHA / robot check; the stage can never pass on it."""
+
+    def __init__(self, reason, url):
+        super().__init__(FailureKind.BOT_WALL, f"{reason} served at {url}")
+        self.reason = reason
+        self.url = url
+        self.stage = None
+
+
+def describe_failure(exc):
+    message = exc.message if isinstance(exc, StageFailure) else str(exc)
+    return message.splitlines()[0] if message else type(exc).__name__
+
+
+def classify_failure(exc):
+    if isinstance(exc, StageFailure):
+        return exc.kind
+    if isinstance(exc, TimeoutError):
+        return FailureKind.TIMEOUT
+    # Imported here so collection never pays for playwright; a playwright
+    # error implies it is already loaded
+    if "playwright" in sys.modules:
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+        if isinstance(exc, PlaywrightTimeoutError):
+            return FailureKind.TIMEOUT
+    if isinstance(exc, AssertionError):
+        return FailureKind.ASSERTION
+    return FailureKind.ERROR
+
+
+class RetryPolicy:
+    """How often and how fast a failing stage is retried.
+
+    ``budget`` caps the number of retries across all stages of one test,
+    so a badly broken run still fails quickly.
+    """
+
+    # Bot walls are never retried: nothing after one can succeed in an unattended run
+    DEFAULT_RETRY_ON = (FailureKind.TIMEOUT, FailureKind.SELECTOR_MISS)
+
+    def __init__(self, max_attempts=3, budget=3, backoff=1.0, backoff_factor=2.0,
+                 max_backoff=10.0, retry_on=DEFAULT_RETRY_ON):
+        self.max_attempts = max_attempts
+        self.budget = budget
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_on = tuple(retry_on)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_attempts=int(os.getenv("STAGE_MAX_ATTEMPTS", "3")),
+            budget=int(os.getenv("STAGE_RETRY_BUDGET", "3")),
+            backoff=float(os.getenv("STAGE_RETRY_BACKOFF", "1.0")),
+        )
+
+    def delay(self, retry_number):
+        return min(self.backoff * self.backoff_factor ** (retry_number - 1), self.max_backoff)
+
+
+class StageRunner:
+    """Runs the stages of one flow, retrying only the stage that failed.
+
+    After every successful stage the current URL is kept as a checkpoint;
+    a retry navigates back to it instead of restarting the whole flow.
+    ``wall_check(response=None)`` raises ``BotWall`` when the page is
+    walled (``response`` being the navigation that loaded it); it is used
+    to tell a bot wall apart from an ordinary failure and to vet restored
+    checkpoints.
+    """
+
+    def __init__(self, page, policy, step_timer=None, wall_check=None, sleep=time.sleep):
+        self.page = page
+        self.policy = policy
+        self.step_timer = step_timer
+        self.wall_check = wall_check
+        self.sleep = sleep
+        self.checkpoint_url = None
+        self.retries_left = policy.budget
+        self.attempts = []
+
+    def run(self, stage, fn, *args, retry=True, **kwargs):
+        """Run ``fn(*args, **kwargs)`` as ``stage``.
+
+        ``retry=False`` is for stages with side effects that a second run
+        would repeat (e.g. adding items to the cart): failures are recorded
+        and classified but raised on the first attempt.
+        """
+        if self.step_timer is not None:
+            self.step_timer.begin(stage)
+        log.context["stage"] = stage
+        log.info(f"Stage '{stage}' started")
+        try:
+            return self._run(stage, fn, retry, *args, **kwargs)
+        finally:
+            log.context.pop("stage", None)
+
+    def _run(self, stage, fn, retry, *args, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                if attempt > 1:
+                    self.restore_checkpoint()
+                result = fn(*args, **kwargs)
+            except BotWall as e:
+                e.stage = stage
+                self._record(stage, attempt, "quarantined", started, e)
+                raise
+            except Exception as e:
+                kind = classify_failure(e)
+                wall = self._wall_behind(e)
+                if wall is not None:
+                    wall.stage = stage
+                    self._record(stage, attempt, "quarantined", started, wall)
+                    raise wall from e
+                self._record(stage, attempt, kind, started, e)
+                if not retry or not self._should_retry(kind, attempt):
+                    raise
+                self.retries_left -= 1
+                delay = self.policy.delay(attempt)
+                log.warning(
+                    f"Stage '{stage}' failed ({kind}), retrying in {delay:.1f}s",
+                    kind=kind,
+                    error=describe_failure(e),
+                    next_attempt=attempt + 1,
+                    max_attempts=self.policy.max_attempts,
+                )
+                self.sleep(delay)
+                continue
+
+            self._record(stage, attempt, "passed", started)
+            self.checkpoint_url = self.page.url
+            log.info(f"Stage '{stage}' passed", attempt=attempt, checkpoint=self.checkpoint_url)
+            return result
+
+    def restore_checkpoint(self):
+        if self.checkpoint_url is None:
+            return
+        log.info(f"Restoring checkpoint: {self.checkpoint_url}")
+        response = self.page.goto(self.checkpoint_url)
+        self.page.wait_for_load_state("load", timeout=15000)
+        if self.wall_check is not None:
+            self.wall_check(response)
+
+    def _wall_behind(self, error):
+        """Return the BotWall that explains ``error``, if the page is walled."""
+        if self.wall_check is None or classify_failure(error) == FailureKind.ASSERTION:
+            return None
+        try:
+            self.wall_check()
+        except BotWall as wall:
+            return wall
+        except Exception:
+            # The page may be mid-navigation; let the original error decide
+            return None
+        return None
+
+    def _should_retry(self, kind, attempt):
+        return (
+            kind in self.policy.retry_on
+            and attempt < self.policy.max_attempts
+            and self.retries_left > 0
+        )
+
+    def _record(self, stage, attempt, outcome, started, error=None):
+        self.attempts.append({
+            "stage": stage,
+            "attempt": attempt,
+            "outcome": outcome,
+            "seconds": round(time.perf_counter() - started, 3),
+            "error": describe_failure(error) if error else None,
+        })
+
+
+class RetryReport:
+    """Session-wide summary of stage retries and failure classes."""
+
+    def __init__(self):
+        self.failures = Counter()
+        self.failed_stages = Counter()
+        self.recovered = Counter()
+        self.failed_tests = []
+
+    def add(self, nodeid, attempts):
+        failed_last = {}
+        for record in attempts:
+            if record["outcome"] == "quarantined":
+                # Reported separately by the quarantine summary
+                failed_last.pop(record["stage"], None)
+                continue
+            if record["outcome"] == "passed":
+                if record["attempt"] > 1:
+                    self.recovered[record["stage"]] += 1
+                failed_last.pop(record["stage"], None)
+                continue
+            self.failures[record["outcome"]] += 1
+            self.failed_stages[record["stage"]] += 1
+            failed_last[record["stage"]] = record
+        for record in failed_last.values():
+            self.failed_tests.append((nodeid, record))
+
+    def __bool__(self):
+        return bool(self.failures)
+
+    def format_lines(self):
+        lines = ["failures by class: " + ", ".join(f"{kind}={count}" for kind, count in self.failures.most_common())]
+        for stage, count in self.failed_stages.most_common():
+            lines.append(f"  {stage}: {count} failed attempt(s), recovered by retry in {self.recovered[stage]} test(s)")
+        for nodeid, record in self.failed_tests:
+            lines.append(f"  gave up: {nodeid} at '{record['stage']}' [{record['outcome']}] {record['error']}")
+        return lines
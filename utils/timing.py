@@ -0,0 +1,261 @@
+"""Step timing, startup timing and cross-browser matrix helpers."""
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+SUPPORTED_BROWSERS = ("chromium", "firefox", "webkit")
+
+# user_properties key used to ship step timings from workers to the controller
+STEP_TIMINGS_PROPERTY = "step_timings"
+
+
+def requested_browsers(value):
+    """Parse the BROWSER setting into a list of engine names.
+
+    Accepts a single engine, a comma separated list or ``all``.
+    """
+    value = (value or "chromium").strip().lower()
+    if value == "all":
+        return list(SUPPORTED_BROWSERS)
+
+    names = []
+    for name in value.split(","):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+
+    unknown = [name for name in names if name not in SUPPORTED_BROWSERS]
+    if unknown or not names:
+        raise ValueError(
+            f"Unsupported BROWSER value {value!r}; "
+            f"expected 'all' or any of {', '.join(SUPPORTED_BROWSERS)}"
+        )
+    return names
+
+
+class StepTimer:
+    """Records wall-clock duration of the named steps of one test.
+
+    ``begin()`` closes the running step before starting the next one, so a
+    flow can be annotated with one call per stage.
+    """
+
+    def __init__(self):
+        self.records = []
+        self._current = None
+
+    def begin(self, step):
+        self.end()
+        self._current = (step, time.perf_counter())
+
+    def end(self):
+        if self._current is None:
+            return
+        step, started = self._current
+        self.records.append([step, round(time.perf_counter() - started, 3)])
+        self._current = None
+
+    @contextmanager
+    def step(self, step):
+        self.begin(step)
+        try:
+            yield
+        finally:
+            self.end()
+
+
+class StartupTimes:
+    """Startup cost of one pytest process: phases and lazily imported modules.
+
+    ``timed_import`` is the ``-X importtime`` of the heavy dependencies the
+    fixtures import on first use, measured in-process so it can be reported
+    per xdist worker.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.imports = {}
+
+    def record_phase(self, name, seconds):
+        self.phases[name] = round(seconds, 3)
+
+    def timed_import(self, module_name):
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        self.imports[module_name] = round(time.perf_counter() - started, 3)
+        return module
+
+    def as_dict(self):
+        return {"phases": dict(self.phases), "imports": dict(self.imports)}
+
+
+class TimingReport:
+    """Aggregates step timings per browser engine for the whole session."""
+
+    def __init__(self):
+        # {step: {browser: [seconds, ...]}}
+        self._samples = defaultdict(lambda: defaultdict(list))
+        self._step_order = []
+        self._browsers = []
+        # [(browser, {step: seconds}), ...], one entry per test
+        self._tests = []
+        # {process: StartupTimes.as_dict()}
+        self.startup = {}
+
+    def add(self, browser_name, records):
+        if browser_name not in self._browsers:
+            self._browsers.append(browser_name)
+        steps = defaultdict(float)
+        for step, seconds in records:
+            if step not in self._step_order:
+                self._step_order.append(step)
+            self._samples[step][browser_name].append(seconds)
+            steps[step] += seconds
+        if steps:
+            self._tests.append((browser_name, dict(steps)))
+
+    def add_startup(self, process, startup):
+        self.startup[process] = startup
+
+    def __bool__(self):
+        return bool(self._step_order)
+
+    def summary(self):
+        browsers = [b for b in SUPPORTED_BROWSERS if b in self._browsers]
+        rows = {}
+        for step in self._step_order:
+            rows[step] = {}
+            for browser_name in browsers:
+                samples = self._samples[step].get(browser_name)
+                if samples:
+                    rows[step][browser_name] = round(sum(samples) / len(samples), 3)
+        # A test that stops early (e.g. no add-to-cart) runs fewer steps, so
+        # totals only cover the steps every test ran, or the engine that ran
+        # the whole flow would look slowest
+        total_steps = [
+            step for step in self._step_order
+            if all(step in steps for _, steps in self._tests)
+        ]
+        totals = {}
+        for browser_name in browsers:
+            per_test = [
+                sum(steps[step] for step in total_steps)
+                for name, steps in self._tests if name == browser_name
+            ]
+            totals[browser_name] = round(sum(per_test) / len(per_test), 3)
+        return {
+            "browsers": browsers,
+            "steps": rows,
+            "totals": totals,
+            "total_steps": total_steps,
+            "startup": self.startup,
+        }
+
+    def format_startup(self):
+        lines = []
+        for process, startup in sorted(self.startup.items()):
+            parts = [f"{name} {seconds:.2f}s" for name, seconds in startup["phases"].items()]
+            parts += [f"import {name} {seconds:.2f}s" for name, seconds in startup["imports"].items()]
+            lines.append(f"startup {process}: " + (", ".join(parts) or "-"))
+        return lines
+
+    def format_table(self):
+        if not self:
+            return []
+        summary = self.summary()
+        browsers = summary["browsers"]
+        width = max([len("step")] + [len(step) for step in summary["steps"]] + [len("total")])
+
+        lines = ["step".ljust(width) + "".join(f"{b:>12}" for b in browsers)]
+        for step, row in list(summary["steps"].items()) + [("total", summary["totals"])]:
+            cells = []
+            present = {b: row[b] for b in browsers if b in row}
+            slowest = max(present, key=present.get) if len(present) > 1 else None
+            for browser_name in browsers:
+                if browser_name not in row:
+                    cells.append(f"{'-':>12}")
+                    continue
+                marker = "*" if browser_name == slowest else " "
+                cells.append(f"{row[browser_name]:>10.2f}s{marker}")
+            lines.append(step.ljust(width) + "".join(cells))
+        if len(summary["total_steps"]) < len(summary["steps"]):
+            lines.append(f"(total covers the steps every test ran: {', '.join(summary['total_steps']) or '-'})")
+        if len(browsers) > 1:
+            lines.append("(* slowest engine for the step, mean seconds per test)")
+        return lines
+
+    def write_json(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as fh:
+            json.dump(self.summary(), fh, indent=2)
+
+
+class BrowserSlots:
+    """Cross-process limit on the number of simultaneously launched browsers.
+
+    Slots are ``flock``-ed files in a directory shared by all xdist workers
+    of the same run, so the limit holds across the whole session. The OS
+    drops the lock when a worker dies, so a crashed worker never holds a
+    slot for good; ``timeout`` bounds the wait for a free one.
+    """
+
+    def __init__(self, limit, directory, poll_interval=0.5, timeout=600.0):
+        self.limit = limit
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        if self.limit > 0:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_directory():
+        return tempfile.mkdtemp(prefix="amazon-ux-browser-slots-")
+
+    @staticmethod
+    def remove_directory(directory):
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def acquire(self):
+        if self.limit <= 0:
+            return None
+        # POSIX only; imported here so the unlimited default works everywhere
+        import fcntl
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            for index in range(self.limit):
+                slot = open(os.path.join(self.directory, f"slot-{index}"), "a")
+                try:
+                    fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    slot.close()
+                    continue
+                slot.truncate(0)
+                slot.write(str(os.getpid()))
+                slot.flush()
+                return slot
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"No browser slot free after {self.timeout:.0f}s "
+                    f"({self.limit} slots in {self.directory}); "
+                    f"raise MAX_CONCURRENT_BROWSERS or BROWSER_SLOT_TIMEOUT"
+                )
+            time.sleep(self.poll_interval)
+
+    def release(self, slot):
+        if slot is None:
+            return
+        import fcntl
+
+        fcntl.flock(slot, fcntl.LOCK_UN)
+        slot.close()